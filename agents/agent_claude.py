@@ -20,21 +20,23 @@ load_dotenv()
 # Get the Anthropic model from environment variable
 ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL')
 
-def agent_claude(_image, _gen_info):
+def agent_claude(_image, _gen_info, _client=None):
     """
     Generate a story and title based on the input image using the Anthropic API.
 
     Args:
         _image (str): Path to the input image file.
         _gen_info (str): Additional generation information.
+        _client (Anthropic, optional): Existing client to reuse. A new one is
+            created when omitted.
 
     Returns:
         dict: A dictionary containing the generated title and article.
     """
     logger.info(f"Using Anthropic API with model: {ANTHROPIC_MODEL}")
 
-    # Initialize the Anthropic client
-    client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    # Initialize the Anthropic client, unless a warm one was handed in
+    client = _client or Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
 
     # Read and encode the image
     with open(_image, "rb") as image_file:
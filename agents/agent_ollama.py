@@ -12,7 +12,7 @@ from ollama import generate
 logger = logging.getLogger(__name__)
 
 
-def agent_ollama(_image, _gen_info, _model):
+def agent_ollama(_image, _gen_info, _model, _client=None, _keep_alive=None):
     """
     Generate a story and title based on the input image using the Ollama local LLM.
 
@@ -20,11 +20,17 @@ def agent_ollama(_image, _gen_info, _model):
         _image (str): Path to the input image file.
         _gen_info (str): Additional generation information.
         _model (str): Name of the Ollama model to use.
+        _client (ollama.Client, optional): Existing client to reuse. The
+            module-level default client is used when omitted.
+        _keep_alive (str or float, optional): How long Ollama should keep the
+            model loaded after the request. A duration string such as '30m',
+            or a number of seconds (-1 for forever).
 
     Returns:
         dict: A dictionary containing the generated title and article.
     """
     logger.info(f"Using Ollama with model: {_model}")
+    _generate = _client.generate if _client else generate
 
     with open(_image, "rb") as image_file:
         image_data = image_file.read()
@@ -42,11 +48,12 @@ def agent_ollama(_image, _gen_info, _model):
 
             {_gen_info}
         """
-        article_response = generate(
+        article_response = _generate(
             model=_model,
             prompt=article_prompt,
             images=[image_data],
-            stream=False
+            stream=False,
+            keep_alive=_keep_alive
         )
         article_story = article_response['response']
         logger.info("Generated article from Ollama")
@@ -61,11 +68,12 @@ def agent_ollama(_image, _gen_info, _model):
             Aim to create a caption that will make users stop scrolling and want to engage with the post.
             The caption should intrigue viewers, complement the image, and encourage likes, comments, or shares.
         """
-        title_response = generate(
+        title_response = _generate(
             model=_model,
             prompt=title_prompt,
             images=[image_data],
-            stream=False
+            stream=False,
+            keep_alive=_keep_alive
         )
         title = title_response['response']
         logger.info("Generated title from Ollama")
@@ -43,6 +43,16 @@ LLM_SOURCE = os.getenv('LLM_SOURCE')
 TAGLINE = os.getenv('TAGLINE')
 ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL')
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE')
+# Ollama parses a string keep_alive as a duration ('30m'), so bare numbers
+# like '-1' must be sent as numbers (seconds, negative means forever)
+try:
+    OLLAMA_KEEP_ALIVE = float(OLLAMA_KEEP_ALIVE)
+except (TypeError, ValueError):
+    pass
+
+# Shared HTTP session so repeated Ghost calls reuse the same connection
+session = requests.Session()
 
 
 def get_jwt():
@@ -78,7 +88,7 @@ def add_post(post_data):
         'Authorization': f'Ghost {jwt_token}',
         "Accept-Version": "v3.0"
     }
-    response = requests.post(url, json=post_json, headers=headers)
+    response = session.post(url, json=post_json, headers=headers)
     logger.info(f"API Response: {response.status_code}")
     if response.status_code == 201:
         logger.info(f"POSTED ARTICLE: {post_data['title']}")
@@ -88,19 +98,22 @@ def add_post(post_data):
         return False
 
 
-def generate_content_with_fallback(image_path, generation_data):
+def generate_content_with_fallback(image_path, generation_data, clients=None):
     """
     Generate content using the specified LLM with a fallback mechanism.
+    Optional `clients` dict may hold warm 'anthropic' and 'ollama' clients.
     Returns a tuple of (ai_data_return, model_used)
     """
+    clients = clients or {}
     try:
         if LLM_SOURCE == 'remote':
             logger.info(f"Attempting to use remote LLM: {ANTHROPIC_MODEL}")
-            ai_data_return = agent_claude(image_path, generation_data)
+            ai_data_return = agent_claude(image_path, generation_data, clients.get('anthropic'))
             return ai_data_return, ANTHROPIC_MODEL
         elif LLM_SOURCE == 'local':
             logger.info(f"Using local LLM: {OLLAMA_MODEL}")
-            ai_data_return = agent_ollama(image_path, generation_data, OLLAMA_MODEL)
+            ai_data_return = agent_ollama(image_path, generation_data, OLLAMA_MODEL,
+                                          clients.get('ollama'), OLLAMA_KEEP_ALIVE)
             return ai_data_return, OLLAMA_MODEL
         else:
             raise ValueError(f"Invalid LLM_SOURCE: {LLM_SOURCE}")
@@ -110,7 +123,8 @@ def generate_content_with_fallback(image_path, generation_data):
         # Fallback to local Ollama if remote fails
         if LLM_SOURCE == 'remote':
             logger.info(f"Falling back to local Ollama LLM: {OLLAMA_MODEL}")
-            ai_data_return = agent_ollama(image_path, generation_data, OLLAMA_MODEL)
+            ai_data_return = agent_ollama(image_path, generation_data, OLLAMA_MODEL,
+                                          clients.get('ollama'), OLLAMA_KEEP_ALIVE)
             return ai_data_return, OLLAMA_MODEL
         else:
             # If local was the primary and it failed, we don't have another fallback
@@ -118,12 +132,12 @@ def generate_content_with_fallback(image_path, generation_data):
             raise
 
 
-def process_image(filename):
-    """Process a single image."""
+def process_image(filename, clients=None):
+    """Process a single image. Returns True if the post was published."""
     logger.info(f"Processing image: {filename}")
     if not filename.endswith(".png"):
         logger.warning(f"Skipping file {filename}. Not a PNG file.")
-        return
+        return False
 
     # Get image details
     image_path = os.path.join(INPUT_DIR, filename)
@@ -155,7 +169,7 @@ def process_image(filename):
         jwt_token = get_jwt()
         headers = {"Authorization": f"Ghost {jwt_token}", "Accept-Version": "v3.0"}
         upload_url = f"{API_URL}/images/upload/"
-        response = requests.post(upload_url, headers=headers, files=files)
+        response = session.post(upload_url, headers=headers, files=files)
         image_url = response.json()["images"][0]["url"]
         logger.info(f"Uploaded image to Ghost API: {image_url}")
 
@@ -168,12 +182,12 @@ def process_image(filename):
 
     # Generate content using LLM with fallback
     try:
-        ai_data_return, model_used = generate_content_with_fallback(image_path, generation_data)
+        ai_data_return, model_used = generate_content_with_fallback(image_path, generation_data, clients)
         logger.info(f"Successfully generated title and article using model: {model_used}")
         logger.debug(f"Raw LLM output: {ai_data_return}")
     except Exception as e:
         logger.error(f"Failed to generate content: {str(e)}")
-        return
+        return False
 
     # Prepare post data
     article = ai_data_return['article'].replace('\n\n', '<br/>')
@@ -233,6 +247,7 @@ def process_image(filename):
             logger.error(f"Error removing temporary file {temp_file}: {e}")
 
     logger.info(f"Finished processing image: {filename}")
+    return posted
 
 
 def main():
@@ -0,0 +1,425 @@
+"""
+AI Image Processing Daemon
+
+Long-running companion to app.py. Instead of starting a fresh interpreter for
+every batch, this keeps the Anthropic, Ollama and Ghost clients alive, keeps
+the Ollama model loaded with a scheduled keep-alive ping, and accepts jobs
+over a local HTTP endpoint (TCP or Unix socket) so an A1111 post-generation
+hook can push an image as soon as it is saved.
+
+Endpoints:
+    POST /jobs        {"path": "/abs/path/image.png"} or {"filename": "image.png"}
+                      Optional "generation_data" is written as the .txt sidecar.
+                      Returns 202 with {"id": ..., "status": "queued"}, or 200 with
+                      the existing job if that image is already queued or running.
+                      Returns 409 instead of overwriting a same-named image that
+                      is already waiting in INPUT_DIR.
+    GET  /jobs/<id>   Returns the job id, filename and status.
+    GET  /health      Returns daemon status and queue size.
+
+POST /jobs only accepts Content-Type: application/json, so a web page cannot
+submit jobs with a plain cross-site form or text/plain request. On TCP the
+Host header must be 127.0.0.1, localhost or DAEMON_HOST, which blocks DNS
+rebinding. When
+DAEMON_TOKEN is set, /jobs requests must send "Authorization: Bearer <token>".
+A "path" must be inside INPUT_DIR or A1111_OUTPUT_DIR.
+"""
+
+import filecmp
+import hmac
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import stat
+import threading
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from anthropic import Anthropic
+from ollama import Client
+
+# Local Imports
+import app
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DAEMON_HOST = os.getenv('DAEMON_HOST', '127.0.0.1')
+DAEMON_PORT = int(os.getenv('DAEMON_PORT', '8765'))
+DAEMON_SOCKET = os.getenv('DAEMON_SOCKET')
+DAEMON_TOKEN = os.getenv('DAEMON_TOKEN')
+A1111_OUTPUT_DIR = os.getenv('A1111_OUTPUT_DIR')
+OLLAMA_PING_INTERVAL = int(os.getenv('OLLAMA_PING_INTERVAL', '240'))
+MAX_JOBS_KEPT = 1000
+MAX_BODY_SIZE = 1024 * 1024
+
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+submit_lock = threading.Lock()
+job_queue = queue.Queue()
+stop_event = threading.Event()
+
+
+def create_clients():
+    """Create the long-lived LLM clients shared by every job."""
+    clients = {'ollama': Client()}
+    if app.LLM_SOURCE == 'remote':
+        clients['anthropic'] = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+    return clients
+
+
+def ping_ollama(client, quiet=False):
+    """
+    Load (or keep loaded) the Ollama model without generating anything.
+    Returns True on success; with quiet=True a failure is only logged at DEBUG.
+    """
+    try:
+        client.generate(model=app.OLLAMA_MODEL, keep_alive=app.OLLAMA_KEEP_ALIVE)
+        logger.info(f"Ollama keep-alive ping: {app.OLLAMA_MODEL}")
+        return True
+    except Exception as e:
+        if quiet:
+            logger.debug(f"Ollama keep-alive ping failed: {str(e)}")
+        else:
+            logger.error(f"Ollama keep-alive ping failed: {str(e)} "
+                         f"(repeat failures are logged at DEBUG until it recovers)")
+        return False
+
+
+def keep_alive_loop(client, healthy):
+    """Ping Ollama on a schedule until the daemon stops, logging only the first failure in a row."""
+    while not stop_event.wait(OLLAMA_PING_INTERVAL):
+        healthy = ping_ollama(client, quiet=not healthy)
+
+
+def set_status(job_id, status):
+    with jobs_lock:
+        jobs[job_id]['status'] = status
+
+
+def worker_loop(clients):
+    """Process queued jobs one at a time; they share OUTPUT_DIR and the LLM."""
+    while not stop_event.is_set():
+        try:
+            job_id, filename, staged = job_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        set_status(job_id, 'running')
+        posted = False
+        try:
+            posted = app.process_image(filename, clients)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed for {filename}: {str(e)}")
+        finally:
+            # Under submit_lock so a resubmission cannot stage a copy we then delete
+            with submit_lock:
+                if staged and not posted:
+                    remove_staged_copy(filename)
+                set_status(job_id, 'done' if posted else 'failed')
+            job_queue.task_done()
+
+
+def remove_staged_copy(filename):
+    """Drop the PNG/TXT the daemon copied into INPUT_DIR so the image can be resubmitted."""
+    png_path = os.path.join(app.INPUT_DIR, filename)
+    for path in [png_path, os.path.splitext(png_path)[0] + ".txt"]:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+                logger.info(f"Removed staged file: {os.path.basename(path)}")
+            except OSError as e:
+                logger.error(f"Error removing staged file {path}: {e}")
+
+
+def is_allowed_path(path):
+    """True if path is inside INPUT_DIR or A1111_OUTPUT_DIR."""
+    allowed_dirs = [app.INPUT_DIR]
+    if A1111_OUTPUT_DIR:
+        allowed_dirs.append(A1111_OUTPUT_DIR)
+    for directory in allowed_dirs:
+        directory = os.path.realpath(directory)
+        if os.path.commonpath([path, directory]) == directory:
+            return True
+    return False
+
+
+def find_active_job(filename):
+    """Return a copy of the queued or running job for filename, if any."""
+    with jobs_lock:
+        for job in jobs.values():
+            if job['filename'] == filename and job['status'] in ('queued', 'running'):
+                return dict(job)
+    return None
+
+
+def validate_payload(payload):
+    """
+    Check a submission before anything touches the filesystem.
+    Returns (src_path, filename). Raises ValueError for anything we cannot process.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object")
+    generation_data = payload.get('generation_data')
+    if generation_data is not None and not isinstance(generation_data, str):
+        raise ValueError("'generation_data' must be a string")
+
+    if payload.get('path'):
+        if not isinstance(payload['path'], str):
+            raise ValueError("'path' must be a string")
+        src_path = os.path.realpath(payload['path'])
+        if not is_allowed_path(src_path):
+            raise ValueError(f"Path is outside INPUT_DIR and A1111_OUTPUT_DIR: {src_path}")
+    elif payload.get('filename'):
+        if not isinstance(payload['filename'], str):
+            raise ValueError("'filename' must be a string")
+        src_path = os.path.join(os.path.realpath(app.INPUT_DIR), os.path.basename(payload['filename']))
+    else:
+        raise ValueError("Request needs a 'path' or 'filename'")
+
+    filename = os.path.basename(src_path)
+    if not filename.endswith('.png'):
+        raise ValueError(f"Not a PNG file: {filename}")
+    if not os.path.isfile(src_path):
+        raise ValueError(f"File not found: {src_path}")
+    return src_path, filename
+
+
+def submit_job(filename, staged=False):
+    """
+    Register a new job and hand it to the worker. `staged` marks images the
+    daemon copied into INPUT_DIR, which are removed again if the job fails.
+    """
+    job_id = uuid.uuid4().hex
+    with jobs_lock:
+        jobs[job_id] = {'id': job_id, 'filename': filename, 'status': 'queued'}
+        job = dict(jobs[job_id])
+        # Forget the oldest finished jobs so the table does not grow forever
+        while len(jobs) > MAX_JOBS_KEPT:
+            oldest_id = next(iter(jobs))
+            if jobs[oldest_id]['status'] in ('queued', 'running'):
+                break
+            jobs.pop(oldest_id)
+    job_queue.put((job_id, filename, staged))
+    logger.info(f"Queued job {job_id}: {filename}")
+    return job
+
+
+def submit_payload(payload):
+    """
+    Validate a submission, stage the image in INPUT_DIR and queue it.
+    Returns (job, created); created is False when an active job for the same
+    image already exists. Raises FileExistsError rather than overwriting a
+    same-named PNG or TXT that is already waiting in INPUT_DIR.
+    """
+    src_path, filename = validate_payload(payload)
+    generation_data = payload.get('generation_data')
+    dst_png = os.path.join(app.INPUT_DIR, filename)
+    dst_txt = os.path.splitext(dst_png)[0] + ".txt"
+    in_input_dir = os.path.dirname(src_path) == os.path.realpath(app.INPUT_DIR)
+
+    # Serialise submissions so two requests cannot stage the same name at once
+    with submit_lock:
+        active_job = find_active_job(filename)
+        if in_input_dir:
+            if active_job:
+                return active_job, False
+            if generation_data and os.path.exists(dst_txt):
+                raise FileExistsError(f"Generation data already exists for {filename}")
+        else:
+            same_image = os.path.exists(dst_png) and filecmp.cmp(src_path, dst_png, shallow=False)
+            if active_job and same_image:
+                return active_job, False
+            # A matching copy with no active job is a leftover (e.g. the daemon
+            # stopped mid-job), so staging it again is safe
+            if active_job or (not same_image and (os.path.exists(dst_png) or os.path.exists(dst_txt))):
+                raise FileExistsError(f"A different image named {filename} is already waiting in INPUT_DIR")
+            shutil.copy(src_path, dst_png)
+            src_txt = os.path.splitext(src_path)[0] + ".txt"
+            if not generation_data and os.path.exists(src_txt):
+                shutil.copy(src_txt, dst_txt)
+
+        if generation_data:
+            with open(dst_txt, 'w') as txt_file:
+                txt_file.write(generation_data)
+
+        return submit_job(filename, staged=not in_input_dir), True
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    """Small JSON API for submitting and checking jobs."""
+
+    def send_json(self, status_code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_allowed_host(self):
+        """
+        Reject unexpected Host headers on the TCP listener. This stops DNS
+        rebinding, where a web page's own hostname resolves to 127.0.0.1.
+        """
+        if isinstance(self.server, UnixHTTPServer):
+            return True
+        allowed_hosts = {'127.0.0.1', 'localhost', DAEMON_HOST.lower()}
+        allowed_hosts |= {f"{host}:{DAEMON_PORT}" for host in allowed_hosts}
+        return self.headers.get('Host', '').strip().lower() in allowed_hosts
+
+    def is_authorized(self):
+        """Check the shared token, if one is configured."""
+        if not DAEMON_TOKEN:
+            return True
+        supplied = self.headers.get('Authorization', '')
+        return hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {DAEMON_TOKEN}".encode('utf-8'))
+
+    def do_GET(self):
+        if not self.is_allowed_host():
+            self.send_json(403, {'error': 'Invalid Host header'})
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok', 'queued': job_queue.qsize()})
+        elif not self.is_authorized():
+            self.send_json(401, {'error': 'Unauthorized'})
+        elif self.path.startswith('/jobs/'):
+            with jobs_lock:
+                job = jobs.get(self.path[len('/jobs/'):])
+                job = dict(job) if job else None
+            if job:
+                self.send_json(200, job)
+            else:
+                self.send_json(404, {'error': 'Job not found'})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if not self.is_allowed_host():
+            self.send_json(403, {'error': 'Invalid Host header'})
+            return
+        if self.path != '/jobs':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        if not self.is_authorized():
+            self.send_json(401, {'error': 'Unauthorized'})
+            return
+        # Requiring JSON forces a CORS preflight, which this server never answers
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self.send_json(415, {'error': 'Content-Type must be application/json'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.send_json(400, {'error': 'Invalid Content-Length'})
+            return
+        if length < 0 or length > MAX_BODY_SIZE:
+            self.send_json(400, {'error': f"Content-Length must be between 0 and {MAX_BODY_SIZE} bytes"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            job, created = submit_payload(payload)
+        except FileExistsError as e:
+            logger.warning(f"Rejected job submission: {str(e)}")
+            self.send_json(409, {'error': str(e)})
+            return
+        except (ValueError, OSError) as e:
+            logger.warning(f"Rejected job submission: {str(e)}")
+            self.send_json(400, {'error': str(e)})
+            return
+        self.send_json(202 if created else 200, {'id': job['id'], 'status': job['status']})
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(path):
+    """
+    Remove a socket file left behind by an earlier daemon. Raises OSError if
+    path is not a socket or another process is still accepting on it.
+    """
+    if not os.path.exists(path):
+        return
+    if not stat.S_ISSOCK(os.stat(path).st_mode):
+        raise OSError(f"DAEMON_SOCKET {path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"Another process is already listening on {path}")
+
+
+def create_server():
+    """Bind to DAEMON_SOCKET if set, otherwise to DAEMON_HOST:DAEMON_PORT."""
+    if DAEMON_SOCKET:
+        remove_stale_socket(DAEMON_SOCKET)
+        logger.info(f"Listening on unix socket {DAEMON_SOCKET}")
+        return UnixHTTPServer(DAEMON_SOCKET, JobHandler)
+    logger.info(f"Listening on http://{DAEMON_HOST}:{DAEMON_PORT}")
+    return ThreadingHTTPServer((DAEMON_HOST, DAEMON_PORT), JobHandler)
+
+
+def main():
+    """Warm up clients, start the worker and keep-alive threads, then serve."""
+    logger.info("Starting image processing daemon")
+
+    for directory in [app.OUTPUT_DIR, app.ARCHIVE_DIR]:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+            logger.info(f"Created directory: {directory}")
+
+    if app.LLM_SOURCE not in ['local', 'remote']:
+        logger.error(f"Invalid LLM_SOURCE: {app.LLM_SOURCE}. Please set it to 'local' or 'remote'.")
+        return
+
+    try:
+        server = create_server()
+    except OSError as e:
+        logger.error(f"Unable to start daemon: {str(e)}")
+        return
+
+    clients = create_clients()
+    threading.Thread(target=worker_loop, args=(clients,), daemon=True).start()
+
+    # Ollama is the fallback for remote too, so keep it warm either way unless
+    # OLLAMA_PING_INTERVAL=0 turns the ping off (e.g. remote without Ollama)
+    if OLLAMA_PING_INTERVAL > 0:
+        healthy = ping_ollama(clients['ollama'])
+        threading.Thread(target=keep_alive_loop, args=(clients['ollama'], healthy), daemon=True).start()
+    else:
+        logger.info("Ollama keep-alive ping disabled (OLLAMA_PING_INTERVAL=0)")
+        if app.LLM_SOURCE == 'local':
+            # Still load the model once so the first job does not pay for it
+            ping_ollama(clients['ollama'])
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down daemon")
+    finally:
+        stop_event.set()
+        server.server_close()
+        if DAEMON_SOCKET and os.path.exists(DAEMON_SOCKET):
+            os.remove(DAEMON_SOCKET)
+
+    logger.info("Daemon stopped")
+
+
+if __name__ == "__main__":
+    main()